@@ -1,21 +1,33 @@
 import express from "express";
 import cors from "cors";
+import { randomUUID } from "crypto";
 
 
 const app = express();
 app.use(cors());
 app.use(express.json());
 
+// Python RAG 服務 (ragcore/app.py)，相同的第一輪問題會在那邊合併成一次檢索 + 生成
+const RAG_API_URL = process.env.RAG_API_URL || "http://127.0.0.1:5000";
+
 
 app.post("/chat", async (req, res) => {
 const { message } = req.body;
-
-
-// 這裡之後可改成：Ollama / OpenAI / RAG
-const reply = `你剛剛說的是：${message}`;
-
-
-res.json({ reply });
+// 每個瀏覽器各自一個 id (前端存在 localStorage)；沒帶的話發一個新的回傳，不共用同一個使用者
+const user_id = req.body.user_id || randomUUID();
+
+try {
+const r = await fetch(`${RAG_API_URL}/ask`, {
+method: "POST",
+headers: { "Content-Type": "application/json" },
+body: JSON.stringify({ question: message, user_id })
+});
+const data = await r.json();
+res.status(r.status).json({ reply: data.answer, sources: data.sources || [], user_id });
+} catch (err) {
+console.error(err);
+res.status(502).json({ reply: "系統忙碌中...", sources: [], user_id });
+}
 });
 
 
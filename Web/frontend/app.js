@@ -2,6 +2,13 @@ const input = document.getElementById("input");
 const sendBtn = document.getElementById("sendBtn");
 const messages = document.getElementById("messages");
 
+// 每個瀏覽器一個固定的 user_id，後端用它區分對話歷史
+let userId = localStorage.getItem("user_id");
+if (!userId) {
+userId = crypto.randomUUID ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2);
+localStorage.setItem("user_id", userId);
+}
+
 
 sendBtn.addEventListener("click", sendMessage);
 input.addEventListener("keydown", e => {
@@ -30,7 +37,7 @@ input.value = "";
 const res = await fetch("http://localhost:3001/chat", {
 method: "POST",
 headers: { "Content-Type": "application/json" },
-body: JSON.stringify({ message: text })
+body: JSON.stringify({ message: text, user_id: userId })
 });
 
 
@@ -1,8 +1,11 @@
-from flask import Flask, request, jsonify
+import json
+import uuid
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from rag_core import initialize_rag_system
 # 引入新寫的模組
 from rag_chat_handler import MultiTurnRAG 
+from rag_singleflight import ReplaceText
 
 app = Flask(__name__)
 CORS(app)
@@ -22,9 +25,9 @@ def init_system():
 def ask_question():
     data = request.json
     user_question = data.get('question', '')
-    # 前端可以傳送一個 user_id (或 session_id) 來區分不同使用者
-    # 這裡暫時預設為 "demo_user"
-    user_id = data.get('user_id', 'demo_user') 
+    # 前端傳送 user_id (或 session_id) 來區分不同使用者
+    # 沒帶的話當成一個新使用者，不共用歷史，並在回應中回傳 user_id 供下一輪使用
+    user_id = data.get('user_id') or uuid.uuid4().hex
     
     if not user_question:
         return jsonify({"answer": "請輸入問題"}), 400
@@ -37,12 +40,52 @@ def ask_question():
         
         return jsonify({
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "user_id": user_id
         })
 
     except Exception as e:
         print(f"❌ 錯誤: {e}")
-        return jsonify({"answer": "系統忙碌中...", "sources": []}), 500
+        return jsonify({"answer": "系統忙碌中...", "sources": [], "user_id": user_id}), 500
+
+@app.route('/ask_stream', methods=['POST'])
+def ask_question_stream():
+    data = request.json
+    user_question = data.get('question', '')
+    user_id = data.get('user_id') or uuid.uuid4().hex
+
+    if not user_question:
+        return jsonify({"answer": "請輸入問題"}), 400
+
+    init_system()
+
+    # 每行一個 JSON (NDJSON)：{"token": ...} ... 最後 {"done": true, "answer": ..., "sources": [...], "user_id": ...}
+    # 偶爾會有 {"replace": ...}，代表用這段完整文字取代先前收到的所有 token
+    def generate():
+        try:
+            for item in chat_handler.process_chat_stream(user_id, user_question):
+                if isinstance(item, tuple):
+                    answer, sources = item
+                    yield json.dumps({"done": True, "answer": answer, "sources": sources, "user_id": user_id}, ensure_ascii=False) + "\n"
+                elif isinstance(item, ReplaceText):
+                    yield json.dumps({"replace": str(item)}, ensure_ascii=False) + "\n"
+                else:
+                    yield json.dumps({"token": item}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"❌ 錯誤: {e}")
+            yield json.dumps({"done": True, "answer": "系統忙碌中...", "sources": [], "user_id": user_id}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    # 相同問題合併 / 預先生成的回答 各省下多少次檢索與生成
+    if chat_handler is None:
+        return jsonify({})
+    return jsonify({
+        "singleflight": chat_handler.inflight.snapshot(),
+        "precomputed": chat_handler.precomputed.snapshot()
+    })
 
 if __name__ == "__main__":
     init_system()
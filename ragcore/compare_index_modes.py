@@ -0,0 +1,153 @@
+"""
+比較不同索引模式 (combined / question / question_answer1) 的建置時間與檢索品質
+
+用法:
+    python compare_index_modes.py --queries eval_queries.jsonl --k 5
+
+建置時間：只計算 Embedding 那一步 (共用同一個已載入的模型，不含讀檔與載入模型)
+  - 索引檔存在且沒加 --rebuild 時直接讀檔，不計時
+  - 本程式不會寫入任何索引檔，不會動到服務正在用的存檔 (也就不會讓預先生成的回答失效)
+檢索品質 (--queries)：用「不在索引裡」的真實或改寫過的使用者問題評估，
+  檔案為 JSON 列表或 JSONL，每筆是 {"question": ..., 以及下列其中一種標準答案}
+    "gold_ids"      : 正確資料的編號列表 (依 FILE_PATHS 讀入順序，從 0 起算)
+    "gold_answer"   : 正確資料的答案原文
+    "gold_question" : 正確資料的問題原文
+  回報 hit@1 / hit@k / MRR，以及兩兩模式前 k 名的重疊比例
+自我檢索 (--sanity N)：拿索引裡原本的問題去查，只能確認索引沒壞，
+  question 模式會因為查詢和索引向量完全相同而幾乎滿分，不能當作品質比較
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import time
+import numpy as np
+
+from rag_core import (
+    FILE_PATHS, INDEX_MODES, MedicalSearchEngine, create_embedding_model,
+    load_records, store_path_for_mode
+)
+
+
+def build_or_load(index_mode, embedding_model, rebuild=False):
+    """回傳 (engine, Embedding 秒數或 None, 平均嵌入字數)"""
+    store_path = store_path_for_mode(index_mode)
+    if os.path.exists(store_path) and not rebuild:
+        print(f"💾 讀取既有索引: {store_path}")
+        with open(store_path, "rb") as f:
+            saved = pickle.load(f)
+        engine = MedicalSearchEngine(saved['texts'], saved['metadatas'], saved['embeddings'],
+                                     embedding_model, index_mode=index_mode)
+        return engine, None, np.mean([len(t) for t in saved['texts']])
+
+    texts, metadatas = load_records(FILE_PATHS, index_mode)
+    print(f"⚡ Embedding 計算 (模式: {index_mode})...")
+    start = time.time()
+    embeddings = embedding_model.embed_documents(texts)
+    elapsed = time.time() - start
+    engine = MedicalSearchEngine(texts, metadatas, embeddings, embedding_model, index_mode=index_mode)
+    return engine, elapsed, np.mean([len(t) for t in texts])
+
+
+def read_eval_queries(path):
+    """讀取 JSON 列表或 JSONL，只保留有 question 與標準答案的項目"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    try:
+        items = json.loads(raw)
+        if not isinstance(items, list):
+            items = [items]
+    except ValueError:
+        items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+    queries = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("question"), str):
+            continue
+        if not any(key in item for key in ("gold_ids", "gold_answer", "gold_question")):
+            continue
+        queries.append(item)
+    print(f"📋 評估問題 {len(queries)} 筆 (略過 {len(items) - len(queries)} 筆格式不符)")
+    return queries
+
+
+def is_gold(engine, idx, query):
+    idx = int(idx)
+    if idx in query.get("gold_ids", ()):
+        return True
+    doc = engine.metadatas[idx]
+    if "gold_answer" in query and doc['a'] == query["gold_answer"].strip():
+        return True
+    if "gold_question" in query and doc['q'] == query["gold_question"].strip():
+        return True
+    return False
+
+
+def evaluate(engine, query_embs, queries, k):
+    _, indices = engine.knn.kneighbors(query_embs, n_neighbors=k)
+    hit1 = hitk = rr = 0.0
+    for row, query in zip(indices, queries):
+        for rank, idx in enumerate(row):
+            if is_gold(engine, idx, query):
+                hit1 += rank == 0
+                hitk += 1
+                rr += 1.0 / (rank + 1)
+                break
+    n = len(queries)
+    return {"hit@1": hit1 / n, f"hit@{k}": hitk / n, "mrr": rr / n}, indices
+
+
+def report(title, engines, embedding_model, queries, k):
+    print("=" * 20 + f" {title} " + "=" * 20)
+    query_embs = np.array(embedding_model.embed_documents([q["question"] for q in queries]))
+    top = {}
+    for mode, engine in engines.items():
+        scores, top[mode] = evaluate(engine, query_embs, queries, k)
+        print(f"{mode:<18} " + "  ".join(f"{name}={val:.4f}" for name, val in scores.items()))
+    modes = list(engines)
+    for i in range(len(modes)):
+        for j in range(i + 1, len(modes)):
+            a, b = top[modes[i]], top[modes[j]]
+            overlap = np.mean([len(set(x) & set(y)) / k for x, y in zip(a, b)])
+            print(f"top-{k} 重疊 {modes[i]} vs {modes[j]}: {overlap:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["combined", "question"], choices=INDEX_MODES)
+    parser.add_argument("--queries", help="評估用問題檔 (JSON / JSONL，需含標準答案)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sanity", type=int, default=0, help="另外跑 N 筆自我檢索 (只做健全性檢查)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rebuild", action="store_true", help="忽略既有索引檔，在記憶體中重新計算並計時 (不存檔)")
+    args = parser.parse_args()
+
+    embedding_model = create_embedding_model()
+
+    engines = {}
+    print("=" * 20 + " 建置 " + "=" * 20)
+    for mode in args.modes:
+        engine, elapsed, avg_len = build_or_load(mode, embedding_model, args.rebuild)
+        engines[mode] = engine
+        took = f"Embedding {elapsed:.2f} 秒" if elapsed is not None else "(沿用舊檔，未計時，加 --rebuild)"
+        print(f"[{mode}] 筆數 {len(engine.metadatas)}，平均嵌入長度 {avg_len:.1f} 字，{took}")
+
+    if args.queries:
+        queries = read_eval_queries(args.queries)
+        if queries:
+            report("檢索品質 (held-out 問題)", engines, embedding_model, queries, args.k)
+    else:
+        print("⚠️ 沒有指定 --queries，不輸出檢索品質比較")
+
+    if args.sanity:
+        # 所有模式的 metadatas 順序相同 (同一份來源檔)，直接從第一個抽樣
+        base = engines[args.modes[0]]
+        random.seed(args.seed)
+        picks = random.sample(range(len(base.metadatas)), min(args.sanity, len(base.metadatas)))
+        queries = [{"question": base.metadatas[i]['q'], "gold_question": base.metadatas[i]['q']} for i in picks]
+        report("自我檢索 (健全性檢查，不是品質指標)", engines, embedding_model, queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
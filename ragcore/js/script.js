@@ -6,6 +6,13 @@ document.addEventListener('DOMContentLoaded', () => {
     const modalBody = document.getElementById('modal-body');
     const closeBtn = document.querySelector('.close-btn');
 
+    // 每個瀏覽器一個固定的 user_id，後端用它區分對話歷史 (不要大家共用同一個)
+    let userId = localStorage.getItem('user_id');
+    if (!userId) {
+        userId = crypto.randomUUID ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem('user_id', userId);
+    }
+
     // 關閉 Modal 的功能
     closeBtn.onclick = () => modal.classList.add('hidden');
     window.onclick = (e) => { if (e.target == modal) modal.classList.add('hidden'); }
@@ -24,7 +31,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('http://127.0.0.1:5000/ask', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ question: question })
+                body: JSON.stringify({ question: question, user_id: userId })
             });
 
             const data = await response.json();
@@ -0,0 +1,176 @@
+"""
+離線批次預先生成常見問題的回答 (離峰時段執行)
+
+用法:
+    python pregenerate_answers.py query_log.txt --top 3000 --workers 4
+
+輸入可以是 (依序嘗試)：
+  - JSON 列表，元素是字串或 {"question": ...}
+  - JSONL 查詢紀錄，一行一個 {"question": ...}
+  - 純文字，一行一個問題 (查詢紀錄，重複出現的次數就是熱門度)
+  其他型別的項目或沒有 question 的物件會被略過
+流程：
+  1. 依正規化後的問題計算次數，取前 --top 名
+  2. 一次批次做 Embedding + KNN 檢索 (search_batch)
+  3. 用 --workers 個並行請求打 Ollama 生成 (Ollama 沒有批次 API，靠並行吃滿吞吐量，
+     伺服器端請設定 OLLAMA_NUM_PARALLEL >= workers)
+  4. 寫入 precomputed_answers.json，每筆帶 index_version / prompt_version，
+     索引、Prompt 模板或檢索 / 生成設定改變後舊的回答會自動失效，重跑本程式即可補齊
+     (過期的回答預設會從檔案中移除，加 --keep-stale 才保留)
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rag_core import initialize_rag_system
+from rag_chat_handler import MultiTurnRAG, RETRIEVE_K
+from rag_precomputed import PRECOMPUTED_PATH, load_table, save_table
+from rag_singleflight import normalize_question
+
+
+def _question_of(item):
+    """字串或 {"question": 字串} 才算問題，其餘回傳 None"""
+    if isinstance(item, dict):
+        item = item.get("question")
+    if isinstance(item, str) and item.strip():
+        return item
+    return None
+
+
+def _parse_jsonl(lines):
+    items = []
+    for line in lines:
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            return None
+    # 每行都是 JSON 但全都不是物件 (例如一行一個數字)，當成純文字處理
+    if not any(isinstance(item, dict) for item in items):
+        return None
+    return items
+
+
+def read_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    lines = [line.strip() for line in raw.splitlines() if line.strip()]
+
+    # 1. 整個檔案是一個 JSON 列表
+    items = None
+    try:
+        data = json.loads(raw)
+        if isinstance(data, list):
+            items = data
+    except ValueError:
+        pass
+    # 2. JSONL，一行一個 JSON 物件
+    if items is None:
+        items = _parse_jsonl(lines)
+    # 3. 純文字，一行一個問題
+    if items is None:
+        items = lines
+
+    questions = [q for q in map(_question_of, items) if q is not None]
+    skipped = len(items) - len(questions)
+    if skipped:
+        print(f"⚠️ 略過 {skipped} 筆不是問題的項目")
+    return questions
+
+
+def pick_top_questions(questions, top):
+    """回傳 [(key, 最常見的原始問法, 次數)]，依次數排序"""
+    counts = Counter()
+    phrasings = {}
+    for q in questions:
+        key = normalize_question(q)
+        if not key: continue
+        counts[key] += 1
+        phrasings.setdefault(key, Counter())[q.strip()] += 1
+    return [(key, phrasings[key].most_common(1)[0][0], n) for key, n in counts.most_common(top)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("questions", help="查詢紀錄或問題列表檔")
+    parser.add_argument("--top", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=4, help="同時送給 Ollama 的請求數")
+    parser.add_argument("--batch", type=int, default=512, help="檢索批次大小")
+    parser.add_argument("--output", default=PRECOMPUTED_PATH)
+    parser.add_argument("--force", action="store_true", help="版本相同的舊回答也重新生成")
+    parser.add_argument("--save-every", type=int, default=100, help="每生成幾筆就存檔一次 (0 = 只在最後存檔)")
+    parser.add_argument("--keep-stale", action="store_true", help="保留版本不符的舊回答 (預設會移除)")
+    args = parser.parse_args()
+    if args.save_every < 0:
+        parser.error("--save-every 不能小於 0")
+
+    engine = initialize_rag_system()
+    handler = MultiTurnRAG(engine)
+    print(f"🔖 index_version={engine.index_version}  prompt_version={handler.prompt_version}")
+
+    table = load_table(args.output)
+    entries = table.setdefault("entries", {})
+    if not args.keep_stale:
+        stale = [key for key, entry in entries.items() if not handler.precomputed.is_fresh(entry)]
+        for key in stale:
+            del entries[key]
+        if stale:
+            print(f"🧹 移除 {len(stale)} 筆版本不符的舊回答")
+
+    picked = pick_top_questions(read_questions(args.questions), args.top)
+    todo = [
+        (key, q, n) for key, q, n in picked
+        if args.force or key not in entries or not handler.precomputed.is_fresh(entries[key])
+    ]
+    print(f"📋 熱門問題 {len(picked)} 筆，需要 (重新) 生成 {len(todo)} 筆")
+    if not todo:
+        save_table(args.output, table)
+        return
+
+    # 1. 批次檢索 (第一輪問題沒有歷史，不需要重寫)
+    start = time.time()
+    prompts = []
+    for i in range(0, len(todo), args.batch):
+        chunk = todo[i:i + args.batch]
+        for (key, q, n), results in zip(chunk, engine.search_batch([q for _, q, _ in chunk], k=RETRIEVE_K)):
+            context_str, sources = handler.format_results(results)
+            prompts.append((key, q, n, handler.build_prompt([], context_str, q), sources))
+    print(f"🔍 批次檢索完成，耗時 {time.time() - start:.2f} 秒")
+
+    # 2. 並行生成
+    def run(item):
+        key, q, n, prompt, sources = item
+        return key, q, n, handler.generate(prompt), sources
+
+    start = time.time()
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run, item) for item in prompts]
+        for future in as_completed(futures):
+            try:
+                key, q, n, answer, sources = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ 生成失敗: {e}")
+                continue
+            entries[key] = {
+                "question": q,
+                "count": n,
+                "answer": answer,
+                "sources": sources,
+                "index_version": engine.index_version,
+                "prompt_version": handler.prompt_version,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            done += 1
+            if args.save_every and done % args.save_every == 0:
+                save_table(args.output, table)
+                print(f"   ... {done}/{len(prompts)} ({done / (time.time() - start):.2f} 筆/秒)")
+
+    save_table(args.output, table)
+    print(f"✅ 完成 {done} 筆，失敗 {failed} 筆，耗時 {time.time() - start:.2f} 秒 -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,63 @@
 import requests
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 from opencc import OpenCC
+from rag_singleflight import SingleFlight, InFlightCall, ReplaceText, normalize_question
+from rag_precomputed import PrecomputedAnswers, PRECOMPUTED_PATH
 
 # 引用您原本的設定
 WINDOWS_IP = "172.18.112.1"
 OLLAMA_API_URL = f"http://{WINDOWS_IP}:11434/api/generate"
 MODEL_NAME = "qwen2.5:14b"
 cc = OpenCC('s2twp')
+# 檢索 / 生成設定 (都會算進 prompt_version，改了預先生成的回答就會失效)
+RETRIEVE_K = 3
+SCORE_THRESHOLD = 0.35
+GENERATE_OPTIONS = {
+    "temperature": 0.4,
+    "num_ctx": 4096
+}
+# 最多保留幾個使用者的對話歷史，超過時丟掉最久沒用的 (LRU)
+MAX_SESSIONS = 10000
+# 串流時只轉換到最後一個標點為止再送出 (詞組不會跨過標點，已送出的部分不會再變)
+STREAM_BOUNDARIES = "。！？!?，,；;：:、\n"
 
 class MultiTurnRAG:
     def __init__(self, rag_engine):
         self.rag_engine = rag_engine
         # 簡單的記憶體暫存，實際生產環境通常用 Redis 或資料庫
         # 結構: { "user_id": [ {"role": "user", "content": "..."}, ... ] }
-        self.sessions = {} 
+        # 用 OrderedDict 當 LRU，最多 MAX_SESSIONS 個使用者
+        self.sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        # 相同問題的並行請求合併器 (見 rag_singleflight.py)
+        self.inflight = SingleFlight()
+        # 離線預先生成的常見問題回答 (見 pregenerate_answers.py)，版本不符的自動忽略
+        self.prompt_version = self.get_prompt_version()
+        self.precomputed = PrecomputedAnswers(
+            PRECOMPUTED_PATH,
+            getattr(rag_engine, "index_version", None),
+            self.prompt_version
+        )
 
     def get_history(self, user_id, limit=6):
         """取得最近 N 輪對話歷史"""
-        history = self.sessions.get(user_id, [])
-        return history[-limit:] # 限制長度避免 Token 爆炸
+        with self._sessions_lock:
+            history = self.sessions.get(user_id, [])
+            if user_id in self.sessions:
+                self.sessions.move_to_end(user_id)
+            return history[-limit:] # 限制長度避免 Token 爆炸
 
     def update_history(self, user_id, role, content):
-        if user_id not in self.sessions:
-            self.sessions[user_id] = []
-        self.sessions[user_id].append({"role": role, "content": content})
+        with self._sessions_lock:
+            if user_id not in self.sessions:
+                self.sessions[user_id] = []
+            self.sessions.move_to_end(user_id)
+            self.sessions[user_id].append({"role": role, "content": content})
+            while len(self.sessions) > MAX_SESSIONS:
+                self.sessions.popitem(last=False)
 
     def rewrite_query(self, user_question, history):
         """
@@ -66,27 +100,23 @@ class MultiTurnRAG:
             print("⚠️ 重寫失敗，使用原始問題")
             return user_question
 
-    def process_chat(self, user_id, user_question):
-        # 1. 取得歷史
-        history = self.get_history(user_id)
+    def retrieve(self, search_query):
+        """使用 RAG 搜尋並整理成 (context_str, sources)"""
+        results = self.rag_engine.search(search_query, k=RETRIEVE_K)
+        return self.format_results(results)
 
-        # 2. 【關鍵】重寫問題 (解決 "它" 是誰的問題)
-        search_query = self.rewrite_query(user_question, history)
-
-        # 3. 使用重寫後的問題去 RAG 搜尋 (呼叫您原本的 engine)
-        results = self.rag_engine.search(search_query, k=3)
-        
-        # 整理檢索結果
+    def format_results(self, results):
         context_str = ""
         sources = []
         for i, res in enumerate(results):
-            if res['score'] < 0.35: continue
+            if res['score'] < SCORE_THRESHOLD: continue
             context_str += f"【文獻 {i+1}】{res['doc']['a']}\n"
             sources.append({"id": i+1, "content": res['doc']['a'], "score": round(res['score']*10, 2)})
+        return context_str, sources
 
-        # 4. 生成最終回答 (加入 Context + History)
+    def build_prompt(self, history, context_str, user_question):
         # 這裡的 Prompt 稍微調整，讓模型知道有歷史對話的存在
-        final_prompt = f"""
+        return f"""
 你是一位台灣醫師。請參考【歷史對話】與【醫療文獻】，回答患者的最新問題。
 
 【歷史對話】
@@ -100,24 +130,141 @@ class MultiTurnRAG:
 
 醫師回答 (繁體中文，親切專業)：
 """
-        
+
+    def get_prompt_version(self):
+        """
+        模型名稱 + Prompt 模板 + 檢索與生成設定的雜湊
+        其中任何一個改變，預先生成的回答就會失效
+        """
+        template = self.build_prompt("{history}", "{context}", "{question}")
+        settings = json.dumps({
+            "model": MODEL_NAME,
+            "k": RETRIEVE_K,
+            "score_threshold": SCORE_THRESHOLD,
+            "options": GENERATE_OPTIONS
+        }, sort_keys=True)
+        return hashlib.sha1(f"{settings}\n{template}".encode("utf-8")).hexdigest()[:12]
+
+    def generate(self, prompt, on_token=None):
+        """
+        呼叫 Ollama 生成回答
+        有 on_token 時改用串流模式，每到一個標點就把新增的部分 (已轉繁體) 丟給 on_token
+        萬一轉換結果和已送出的前綴不一致，改送 ReplaceText(完整文字)，串起來一定等於最終回答
+        """
         payload = {
             "model": MODEL_NAME,
-            "prompt": final_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.4,
-                "num_ctx": 4096
-            }
+            "prompt": prompt,
+            "stream": on_token is not None,
+            "options": dict(GENERATE_OPTIONS)
         }
 
         print(f"🤖 [Chat] 生成最終回答...")
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=120)
-        raw_answer = response.json().get("response", "")
+        if on_token is None:
+            response = requests.post(OLLAMA_API_URL, json=payload, timeout=120)
+            raw_answer = response.json().get("response", "")
+            return cc.convert(raw_answer)
+
+        raw_answer = ""
+        emitted = ""
+        flushed = 0
+
+        def push(converted):
+            nonlocal emitted
+            if converted.startswith(emitted):
+                on_token(converted[len(emitted):])
+            else:
+                on_token(ReplaceText(converted))
+            emitted = converted
+
+        with requests.post(OLLAMA_API_URL, json=payload, timeout=120, stream=True) as response:
+            for line in response.iter_lines():
+                if not line: continue
+                chunk = json.loads(line)
+                raw_answer += chunk.get("response", "")
+                cut = max(raw_answer.rfind(c) for c in STREAM_BOUNDARIES) + 1
+                if cut > flushed:
+                    push(cc.convert(raw_answer[:cut]))
+                    flushed = cut
+                if chunk.get("done"): break
+
         final_answer = cc.convert(raw_answer)
+        push(final_answer)
+        return final_answer
 
-        # 5. 更新歷史
+    def _run_call(self, call, key, user_question, history):
+        """帶頭的請求：重寫 -> 檢索 -> 生成，結果寫進 call 讓所有等待者共用"""
+        try:
+            search_query = self.rewrite_query(user_question, history)
+            context_str, sources = self.retrieve(search_query)
+            prompt = self.build_prompt(history, context_str, user_question)
+            answer = self.generate(prompt, on_token=call.emit)
+            call.set_result((answer, sources))
+        except Exception as e:
+            call.set_error(e)
+        finally:
+            if key is not None:
+                self.inflight.release(key)
+
+    def _join(self, user_question, history):
+        """
+        沒有歷史的第一輪問題才合併 (有歷史時答案會因人而異)
+        回傳 (call, key, is_leader)
+        """
+        if history:
+            return InFlightCall(), None, True
+        key = normalize_question(user_question)
+        call, is_leader = self.inflight.join(key)
+        if not is_leader:
+            print(f"🔗 [SingleFlight] 合併相同問題: {key}")
+        return call, key, is_leader
+
+    def process_chat(self, user_id, user_question):
+        # 1. 取得歷史
+        history = self.get_history(user_id)
+
+        # 2. 第一輪的常見問題直接用預先生成的回答
+        hit = None if history else self.precomputed.get(user_question)
+        if hit is not None:
+            final_answer, sources = hit
+        else:
+            # 3. 相同的第一輪問題共用同一次「重寫 + 檢索 + 生成」
+            call, key, is_leader = self._join(user_question, history)
+            if is_leader:
+                self._run_call(call, key, user_question, history)
+            final_answer, sources = call.wait()
+
+        # 4. 更新歷史 (每個使用者各自記錄)
         self.update_history(user_id, "user", user_question)
         self.update_history(user_id, "assistant", final_answer)
 
         return final_answer, sources
+
+    def process_chat_stream(self, user_id, user_question):
+        """
+        串流版 process_chat：逐段 yield 回答文字，最後 yield (answer, sources)
+        晚加入的相同問題會先重播已產生的 token
+        """
+        history = self.get_history(user_id)
+
+        hit = None if history else self.precomputed.get(user_question)
+        if hit is not None:
+            final_answer, sources = hit
+            yield final_answer
+        else:
+            call, key, is_leader = self._join(user_question, history)
+            if is_leader:
+                threading.Thread(
+                    target=self._run_call,
+                    args=(call, key, user_question, history),
+                    daemon=True
+                ).start()
+
+            on_replay = None if is_leader else self.inflight.count_replay
+            for token in call.stream(on_replay=on_replay):
+                yield token
+            final_answer, sources = call.wait()
+
+        self.update_history(user_id, "user", user_question)
+        self.update_history(user_id, "assistant", final_answer)
+
+        yield final_answer, sources
@@ -1,22 +1,37 @@
 import json
 import os
 import pickle
+import re
 import torch
 import time
 import numpy as np
 from sklearn.neighbors import NearestNeighbors 
 from langchain_huggingface import HuggingFaceEmbeddings
+from rag_records import CompactRecords
 
 # --- ⚙️ 設定區 ---
 FILE_PATHS = ["health.json", "medical.json"] 
 VECTOR_STORE_PATH = "medical_rag_store_rtx5070.pkl"
 BATCH_SIZE = 512 
 
+# 索引模式 (每種模式各自一個存檔，可以共存)：
+#   "combined"        -> 嵌入 "問題: {q}\n答案: {a}" (原本的做法)
+#   "question"        -> 只嵌入問題，答案留在 metadatas 查詢
+#   "question_answer1"-> 問題 + 答案第一句
+INDEX_MODE = os.environ.get("RAG_INDEX_MODE", "combined")
+INDEX_MODES = ("combined", "question", "question_answer1")
+# question_answer1 取用的答案開頭最多幾個字 (答案沒有句號時也不會把整段塞進去)
+ANSWER_HEAD_MAX_CHARS = 64
+
 # --- 搜尋引擎核心類別 ---
 class MedicalSearchEngine:
-    def __init__(self, texts, metadatas, embeddings, embedding_func):
-        self.texts = texts
-        self.metadatas = metadatas
+    def __init__(self, texts, metadatas, embeddings, embedding_func, index_mode="combined"):
+        # texts 搜尋時用不到，不保留；q / a / source 打包成 CompactRecords，
+        # 只有被取用的前 k 筆才會解碼成字串 (見 rag_records.py)
+        self.index_mode = index_mode
+        # 由 initialize_rag_system 依索引檔設定，預先生成的回答靠它判斷是否過期
+        self.index_version = None
+        self.metadatas = CompactRecords.from_metadatas(metadatas)
         self.embedding_func = embedding_func
         self.embeddings_np = np.array(embeddings)
         
@@ -37,15 +52,62 @@ class MedicalSearchEngine:
             })
         return results
 
-def load_and_embed_files(file_paths):
-    # 初始化 HuggingFace Embedding (這裡只是為了 embed_documents 用)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    temp_embedding_model = HuggingFaceEmbeddings(
+    def search_batch(self, queries, k=5):
+        """一次把多個問題送進 Embedding 與 KNN (離線批次用)，回傳每個問題的結果列表"""
+        query_emb_np = np.array(self.embedding_func.embed_documents(queries))
+        dists, indices = self.knn.kneighbors(query_emb_np, n_neighbors=k)
+        return [
+            [{"doc": self.metadatas[idx], "score": 1 - dist} for dist, idx in zip(row_d, row_i)]
+            for row_d, row_i in zip(dists, indices)
+        ]
+
+def store_path_for_mode(index_mode):
+    """combined 沿用舊檔名，其他模式加上後綴"""
+    if index_mode not in INDEX_MODES:
+        raise ValueError(f"未知的索引模式: {index_mode}")
+    if index_mode == "combined":
+        return VECTOR_STORE_PATH
+    base, ext = os.path.splitext(VECTOR_STORE_PATH)
+    return f"{base}_{index_mode}{ext}"
+
+def first_sentence(text, max_chars=ANSWER_HEAD_MAX_CHARS):
+    parts = re.split(r"(?<=[。！？!?\n])", text, maxsplit=1)
+    return parts[0].strip()[:max_chars]
+
+def build_index_text(q, a, index_mode):
+    """依索引模式決定要送去 Embedding 的字串"""
+    if index_mode == "question":
+        return q
+    if index_mode == "question_answer1":
+        head = first_sentence(a)
+        return f"{q}\n{head}" if head else q
+    return f"問題: {q}\n答案: {a}"
+
+def create_embedding_model(device=None):
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return HuggingFaceEmbeddings(
         model_name="shibing624/text2vec-base-chinese",
         model_kwargs={'device': device},
         encode_kwargs={'batch_size': BATCH_SIZE, 'normalize_embeddings': False}
     )
 
+def store_version(path):
+    """索引檔的版本字串 (檔名 + 修改時間 + 大小)，重建索引後就會改變"""
+    st = os.stat(path)
+    return f"{os.path.basename(path)}@{int(st.st_mtime)}-{st.st_size}"
+
+def save_store(path, texts, metadatas, embeddings, index_mode):
+    with open(path, "wb") as f:
+        pickle.dump({
+            'texts': texts,
+            'metadatas': metadatas,
+            'embeddings': embeddings,
+            'index_mode': index_mode
+        }, f)
+
+def load_records(file_paths, index_mode=INDEX_MODE):
+    """讀取原始 JSON，回傳 (要嵌入的 texts, metadatas)"""
     all_texts = []
     all_metadatas = []
     
@@ -63,57 +125,60 @@ def load_and_embed_files(file_paths):
                 q = item.get('question', '').strip()
                 a = item.get('answer', '').strip()
                 if not q: continue
-                combined_text = f"問題: {q}\n答案: {a}"
-                all_texts.append(combined_text)
+                all_texts.append(build_index_text(q, a, index_mode))
                 all_metadatas.append({"q": q, "a": a, "source": file_path})
+    return all_texts, all_metadatas
+
+def load_and_embed_files(file_paths, index_mode=INDEX_MODE, embedding_model=None):
+    # 沒有傳入模型時才另外初始化 HuggingFace Embedding (這裡只是為了 embed_documents 用)
+    if embedding_model is None:
+        embedding_model = create_embedding_model()
 
-    print(f"⚡ 啟動 Embedding 計算...")
-    embeddings = temp_embedding_model.embed_documents(all_texts)
+    all_texts, all_metadatas = load_records(file_paths, index_mode)
+
+    print(f"⚡ 啟動 Embedding 計算 (模式: {index_mode})...")
+    embeddings = embedding_model.embed_documents(all_texts)
     return all_texts, all_metadatas, embeddings
 
 # ==========================================
 # 🔥 關鍵修改：這就是您缺少的函式
 # ==========================================
-def initialize_rag_system():
+def initialize_rag_system(index_mode=INDEX_MODE):
     """
     初始化 RAG 系統並回傳 SearchEngine 物件
+    index_mode 決定讀取 / 生成哪一份索引檔 (見 INDEX_MODES)
     """
+    store_path = store_path_for_mode(index_mode)
     print("🔄 [rag_core] 初始化系統中...")
     device = "cuda" if torch.cuda.is_available() else "cpu"
     
     # 1. 載入模型
     print(f"🔄 [rag_core] 載入 Embedding 模型 ({device})...")
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="shibing624/text2vec-base-chinese",
-        model_kwargs={'device': device},
-        encode_kwargs={'batch_size': BATCH_SIZE, 'normalize_embeddings': False}
-    )
+    embedding_model = create_embedding_model(device)
 
     # 2. 嘗試讀取 Pickle
-    if os.path.exists(VECTOR_STORE_PATH):
-        print(f"💾 [rag_core] 讀取索引檔: {VECTOR_STORE_PATH}")
-        with open(VECTOR_STORE_PATH, "rb") as f:
+    if os.path.exists(store_path):
+        print(f"💾 [rag_core] 讀取索引檔: {store_path}")
+        with open(store_path, "rb") as f:
             saved_data = pickle.load(f)
         
         search_engine = MedicalSearchEngine(
             saved_data['texts'], 
             saved_data['metadatas'], 
             saved_data['embeddings'], 
-            embedding_model
+            embedding_model,
+            index_mode=saved_data.get('index_mode', 'combined')
         )
+        search_engine.index_version = store_version(store_path)
         return search_engine
     else:
         print("⚠️ [rag_core] 找不到索引檔，嘗試重新生成...")
-        texts, metadatas, embeddings = load_and_embed_files(FILE_PATHS)
-        search_engine = MedicalSearchEngine(texts, metadatas, embeddings, embedding_model)
+        texts, metadatas, embeddings = load_and_embed_files(FILE_PATHS, index_mode, embedding_model)
+        search_engine = MedicalSearchEngine(texts, metadatas, embeddings, embedding_model, index_mode=index_mode)
         
         # 補存檔
-        with open(VECTOR_STORE_PATH, "wb") as f:
-            pickle.dump({
-                'texts': texts,
-                'metadatas': metadatas,
-                'embeddings': embeddings
-            }, f)
+        save_store(store_path, texts, metadatas, embeddings, index_mode)
+        search_engine.index_version = store_version(store_path)
         return search_engine
 
 # --- 這裡讓 rag_core.py 也可以單獨執行測試 ---
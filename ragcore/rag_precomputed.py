@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+
+from rag_singleflight import normalize_question
+
+PRECOMPUTED_PATH = "precomputed_answers.json"
+TABLE_FORMAT = 1
+
+
+class PrecomputedAnswers:
+    """
+    離線預先生成的「常見第一輪問題 -> 回答」對照表
+    每筆都記錄產生時的 index_version / prompt_version，任何一個對不上就視為過期不使用
+    檔案被離線工作更新後 (mtime 改變) 會自動重新讀取，不用重開服務
+    """
+
+    def __init__(self, path, index_version, prompt_version):
+        self.path = path
+        self.index_version = index_version
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._mtime = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "entries": 0}
+        self._maybe_reload()
+
+    def _maybe_reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [Precomputed] 讀取 {self.path} 失敗: {e}")
+            return
+
+        entries, stale = {}, 0
+        for key, entry in table.get("entries", {}).items():
+            if self.is_fresh(entry):
+                entries[key] = entry
+            else:
+                stale += 1
+        with self._lock:
+            self._entries = entries
+            self._mtime = mtime
+            self.stats["entries"] = len(entries)
+            self.stats["stale"] = stale
+        print(f"📚 [Precomputed] 載入 {len(entries)} 筆預先生成的回答 (過期略過 {stale} 筆)")
+
+    def is_fresh(self, entry):
+        return (
+            self.index_version is not None
+            and entry.get("index_version") == self.index_version
+            and entry.get("prompt_version") == self.prompt_version
+        )
+
+    def get(self, question):
+        """命中回傳 (answer, sources)，否則回傳 None"""
+        self._maybe_reload()
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+        return entry["answer"], entry["sources"]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+def load_table(path):
+    if not os.path.exists(path):
+        return {"format": TABLE_FORMAT, "entries": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_table(path, table):
+    """先寫暫存檔再 os.replace，服務端不會讀到寫一半的檔案"""
+    table["format"] = TABLE_FORMAT
+    table["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
@@ -0,0 +1,162 @@
+import sys
+import numpy as np
+
+
+class RecordView:
+    """
+    單筆資料的輕量檢視，只有真的讀取 q / a / source 時才從 buffer 解碼
+    支援 doc['a'] 這種寫法，呼叫端不用改
+    """
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    @property
+    def q(self):
+        return self._store.question(self._idx)
+
+    @property
+    def a(self):
+        return self._store.answer(self._idx)
+
+    @property
+    def source(self):
+        return self._store.source(self._idx)
+
+    def __getitem__(self, key):
+        if key not in ("q", "a", "source"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {"q": self.q, "a": self.a, "source": self.source}
+
+    def __repr__(self):
+        return f"RecordView({self._idx}, q={self.q!r})"
+
+
+class CompactRecords:
+    """
+    把所有問題 / 答案打包成同一個 UTF-8 buffer + offsets 陣列
+    第 i 筆的問題是 buf[offsets[2i]:offsets[2i+1]]，答案是 buf[offsets[2i+1]:offsets[2i+2]]
+    來源檔名只存一份，每筆資料只記一個小整數代碼
+    """
+
+    def __init__(self, buf, offsets, source_codes, sources):
+        self._buf = buf
+        self._view = memoryview(buf)
+        self._offsets = offsets
+        self._source_codes = source_codes
+        self._sources = sources
+
+    @classmethod
+    def from_metadatas(cls, metadatas):
+        parts = []
+        lengths = np.empty(2 * len(metadatas), dtype=np.int64)
+        source_index = {}
+        source_codes = np.empty(len(metadatas), dtype=np.uint16)
+        for i, meta in enumerate(metadatas):
+            qb = meta.get("q", "").encode("utf-8")
+            ab = meta.get("a", "").encode("utf-8")
+            parts.append(qb)
+            parts.append(ab)
+            lengths[2 * i] = len(qb)
+            lengths[2 * i + 1] = len(ab)
+            source = meta.get("source", "")
+            source_codes[i] = source_index.setdefault(source, len(source_index))
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        sources = list(source_index)
+        return cls(b"".join(parts), offsets, source_codes, sources)
+
+    def __len__(self):
+        return len(self._source_codes)
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return RecordView(self, idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield RecordView(self, i)
+
+    def _decode(self, slot):
+        start = int(self._offsets[slot])
+        end = int(self._offsets[slot + 1])
+        return str(self._view[start:end], "utf-8")
+
+    def question(self, idx):
+        return self._decode(2 * idx)
+
+    def answer(self, idx):
+        return self._decode(2 * idx + 1)
+
+    def source(self, idx):
+        return self._sources[self._source_codes[idx]]
+
+    def nbytes(self):
+        return (
+            sys.getsizeof(self._buf)
+            + self._offsets.nbytes
+            + self._source_codes.nbytes
+            + sum(sys.getsizeof(s) for s in self._sources)
+            + sys.getsizeof(self._sources)
+        )
+
+
+def deep_sizeof(obj, seen=None):
+    """list / dict / str 的實際記憶體用量 (共用的物件只算一次)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    return size
+
+
+def report_memory(texts, metadatas, records):
+    """印出舊版 (texts + metadatas) 與 CompactRecords 的每筆平均記憶體"""
+    n = max(len(metadatas), 1)
+    text_bytes = deep_sizeof(texts)
+    meta_bytes = deep_sizeof(metadatas)
+    before = text_bytes + meta_bytes
+    after = records.nbytes()
+    print(f"📏 資料筆數: {len(metadatas)}")
+    print(f"   舊版 texts     : {text_bytes / 1024 / 1024:8.2f} MB ({text_bytes / n:7.1f} B/筆)")
+    print(f"   舊版 metadatas : {meta_bytes / 1024 / 1024:8.2f} MB ({meta_bytes / n:7.1f} B/筆)")
+    print(f"   舊版合計       : {before / 1024 / 1024:8.2f} MB ({before / n:7.1f} B/筆)")
+    print(f"   CompactRecords : {after / 1024 / 1024:8.2f} MB ({after / n:7.1f} B/筆)")
+    if before:
+        print(f"   節省 {1 - after / before:.1%}")
+    return {"records": len(metadatas), "before_bytes": before, "after_bytes": after}
+
+
+if __name__ == "__main__":
+    import pickle
+    from rag_core import VECTOR_STORE_PATH
+
+    print(f"📂 讀取 {VECTOR_STORE_PATH} 量測記憶體...")
+    with open(VECTOR_STORE_PATH, "rb") as f:
+        saved = pickle.load(f)
+    records = CompactRecords.from_metadatas(saved["metadatas"])
+    report_memory(saved["texts"], saved["metadatas"], records)
@@ -0,0 +1,128 @@
+import re
+import threading
+import unicodedata
+
+
+def normalize_question(question):
+    """
+    把問題正規化成合併用的 key：
+    全形轉半形、去除多餘空白、英文轉小寫、去掉結尾的標點符號
+    """
+    text = unicodedata.normalize("NFKC", question or "")
+    text = re.sub(r"\s+", " ", text).strip().casefold()
+    return text.rstrip("?？!！。.~～ ")
+
+
+class ReplaceText(str):
+    """串流中的特殊片段：表示「以這段完整文字取代先前送出的所有內容」"""
+
+
+class InFlightCall:
+    """
+    一次正在進行中的「檢索 + 生成」
+    帶頭的請求負責 emit() 逐字寫入，其他等待者可以從頭重播已產生的 token
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.tokens = []
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def emit(self, token):
+        if not token:
+            return
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def set_result(self, result):
+        with self._cond:
+            self.result = result
+            self.done = True
+            self._cond.notify_all()
+
+    def set_error(self, error):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def stream(self, on_replay=None):
+        """從第一個 token 開始逐一吐出，晚加入的人會先拿到已經生成好的部分"""
+        # 呼叫當下就記錄已存在的 token 數 (不等到開始迭代)，
+        # 只有這些才算重播，之後收到的是即時產生的
+        with self._cond:
+            already = len(self.tokens)
+        if on_replay and already:
+            on_replay(already)
+        return self._iter_tokens()
+
+    def _iter_tokens(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.tokens) and not self.done:
+                    self._cond.wait()
+                pending = self.tokens[index:]
+                finished = self.done
+            for token in pending:
+                yield token
+            index += len(pending)
+            if finished and index >= len(self.tokens):
+                break
+        if self.error is not None:
+            raise self.error
+
+    def wait(self):
+        with self._cond:
+            while not self.done:
+                self._cond.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    相同 key 的並行請求只跑一次，其餘請求共用同一個 InFlightCall
+    完成後立刻移除，之後的新請求會重新計算 (這裡不是快取)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {
+            "leaders": 0,          # 真的去跑檢索 + 生成的次數
+            "coalesced": 0,        # 搭便車的請求數 (= 省下的檢索 / 生成次數)
+            "replayed_tokens": 0,  # 串流晚加入者重播的 token 數
+        }
+
+    def join(self, key):
+        """回傳 (call, is_leader)；is_leader 為 True 時呼叫端必須負責執行並 release()"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                return call, False
+            call = InFlightCall()
+            self._calls[key] = call
+            self.stats["leaders"] += 1
+            return call, True
+
+    def release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def count_replay(self, n):
+        with self._lock:
+            self.stats["replayed_tokens"] += n
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        total = stats["leaders"] + stats["coalesced"]
+        stats["saved_ratio"] = round(stats["coalesced"] / total, 4) if total else 0.0
+        return stats